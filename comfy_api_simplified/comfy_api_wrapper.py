@@ -2,15 +2,72 @@ import json
 import requests
 import uuid
 import logging
-import websockets
 import asyncio
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from urllib3.util.retry import Retry
 from requests.compat import urljoin, urlencode
 from comfy_api_simplified.comfy_workflow_wrapper import ComfyWorkflowWrapper
 import os
+import shutil
+import socket
+import threading
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import orjson
+
+    def _json_dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+
+    _json_loads = orjson.loads
+except ImportError:
+
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+    _json_loads = json.loads
+
+try:
+    from websockets.asyncio.client import connect as ws_connect
+except ImportError:  # websockets < 13 only ships the legacy client
+    from websockets import connect as ws_connect
+from websockets.exceptions import ConnectionClosed
+
+try:
+    from requests_toolbelt.multipart.encoder import MultipartEncoder
+except ImportError:
+    MultipartEncoder = None
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
 
 _log = logging.getLogger(__name__)
 
+# Images and videos are already compressed, so ask /view not to compress them again.
+_VIEW_HEADERS = {"Accept-Encoding": "identity"}
+
+# Reconnect attempts in a row, without a message received in between, before giving up.
+_WS_RECONNECT_ATTEMPTS = 5
+_WS_RECONNECT_BASE_DELAY = 0.5
+_WS_RECONNECT_MAX_DELAY = 10.0
+
+
+def _set_nodelay(websocket):
+    """
+    Disables Nagle's algorithm on the websocket's TCP socket, so small status
+    frames are not held back waiting for ACKs.
+    """
+    sock = websocket.transport.get_extra_info("socket")
+    if sock is None or sock.family not in (socket.AF_INET, socket.AF_INET6):
+        return
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except OSError:
+        _log.debug("Could not set TCP_NODELAY on the websocket", exc_info=True)
+
 
 class ComfyApiWrapper:
     def __init__(
@@ -33,12 +90,72 @@ class ComfyApiWrapper:
         else:
             ws_protocol = "ws"
 
+        # The client ID is appended to these; the safe variant has no credentials
+        # and is only used for logging.
+        self._ws_base_safe = urljoin(
+            f"{ws_protocol}://{url_without_protocol}", "/ws?clientId="
+        )
         if user:
             self.auth = HTTPBasicAuth(user, password)
-            ws_url_base = f"{ws_protocol}://{user}:{password}@{url_without_protocol}"
+            self._ws_base = urljoin(
+                f"{ws_protocol}://{user}:{password}@{url_without_protocol}",
+                "/ws?clientId=",
+            )
         else:
-            ws_url_base = f"{ws_protocol}://{url_without_protocol}"
-        self.ws_url = urljoin(ws_url_base, "/ws?clientId={}")
+            self._ws_base = self._ws_base_safe
+
+        self._url_prompt = urljoin(url, "/prompt")
+        self._url_queue = urljoin(url, "/queue")
+        self._url_history_prefix = urljoin(url, "/history/")
+        self._url_view = urljoin(url, "/view")
+        self._url_upload = urljoin(url, "/upload/image")
+
+        # Sync methods run their coroutines on one long-lived event loop in a
+        # background thread, started on first use.
+        self._bg_loop = None
+        self._bg_thread = None
+        self._bg_lock = threading.Lock()
+
+        # One websocket connection, opened on first use and shared by all prompts
+        # queued by this wrapper. It lives on the background loop.
+        self._client_id = uuid.uuid4().hex
+        self._ws = None
+        self._ws_task = None
+        self._ws_lock = None
+        self._ws_connections = 0
+        # prompt_id -> future resolved with the node outputs when the prompt finishes.
+        self._pending: Dict[str, asyncio.Future] = {}
+        # prompt_id -> node outputs reported so far.
+        self._outputs: Dict[str, dict] = {}
+        # prompt_id -> (outputs, error) of prompts that finished before anyone waited.
+        self._finished: Dict[str, Tuple[dict, Optional[Exception]]] = {}
+        self._history_checks = set()
+
+        # Websocket message type -> handler; other types (e.g. monitor telemetry) are ignored.
+        self._ws_handlers = {
+            "execution_error": self._on_execution_error,
+            "status": self._on_status,
+            "executing": self._on_executing,
+            "executed": self._on_executed,
+        }
+
+        # Reuse pooled keep-alive connections for all HTTP calls instead of
+        # opening a new TCP/TLS connection per request.
+        self.session = requests.Session()
+        self.session.auth = self.auth
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=32,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.2,
+                status_forcelist=[502, 503, 504],
+                # Hand the last response back so the status check below reports it.
+                raise_on_status=False,
+            ),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
 
     def queue_prompt(self, prompt: dict, client_id: str | None = None) -> dict:
         """
@@ -57,10 +174,10 @@ class ComfyApiWrapper:
         p = {"prompt": prompt}
         if client_id:
             p["client_id"] = client_id
-        data = json.dumps(p).encode("utf-8")
-        _log.info(f"Posting prompt to {self.url}/prompt")
-        resp = requests.post(urljoin(self.url, "/prompt"), data=data, auth=self.auth)
-        _log.info(f"{resp.status_code}: {resp.reason}")
+        data = _json_dumps(p)
+        _log.info("Posting prompt to %s", self._url_prompt)
+        resp = self.session.post(self._url_prompt, data=data)
+        _log.info("%s: %s", resp.status_code, resp.reason)
         if resp.status_code == 200:
             return resp.json()
         else:
@@ -68,54 +185,263 @@ class ComfyApiWrapper:
                 f"Request failed with status code {resp.status_code}: {resp.reason}"
             )
 
-    async def queue_prompt_and_wait(self, prompt: dict) -> str:
+    async def queue_prompt_and_wait(
+        self, prompt: dict, timeout: Optional[float] = None
+    ) -> str:
         """
         Queues a prompt for execution and waits for the result.
 
         Args:
             prompt (dict): The prompt to be executed.
+            timeout (float): The maximum number of seconds to wait for the prompt to finish.
+                Defaults to None, which means wait indefinitely.
 
         Returns:
             str: The prompt ID.
 
         Raises:
             Exception: If an execution error occurs.
+            asyncio.TimeoutError: If the prompt does not finish within the timeout.
+        """
+        prompt_id, _ = await self._queue_prompt_and_collect(prompt, timeout)
+        return prompt_id
+
+    async def queue_prompts_and_wait(
+        self, prompts: List[dict], timeout: Optional[float] = None
+    ) -> List[str]:
+        """
+        Queues several prompts at once and waits for all of them. The prompts share one
+        websocket connection, so the server can work through them back to back.
+
+        Args:
+            prompts (List[dict]): The prompts to be executed.
+            timeout (float): The maximum number of seconds to wait for each prompt to finish.
+                Defaults to None, which means wait indefinitely.
+
+        Returns:
+            List[str]: The prompt IDs, in the order of the given prompts.
+
+        Raises:
+            Exception: If an execution error occurs.
+            asyncio.TimeoutError: If a prompt does not finish within the timeout.
+        """
+        return list(
+            await asyncio.gather(
+                *(self.queue_prompt_and_wait(prompt, timeout) for prompt in prompts)
+            )
+        )
+
+    async def _queue_prompt_and_collect(
+        self, prompt: dict, timeout: Optional[float] = None
+    ) -> Tuple[str, dict]:
+        """
+        Queues a prompt and waits for it like queue_prompt_and_wait, also collecting
+        the node outputs reported over the websocket.
+
+        Returns:
+            Tuple[str, dict]: The prompt ID and a mapping of node ID to its output. Nodes
+                whose output was not reported (e.g. cached ones) are missing.
         """
-        client_id = str(uuid.uuid4())
-        resp = self.queue_prompt(prompt, client_id)
+        loop = self._get_bg_loop()
+        coro = self._submit_and_wait(prompt, timeout)
+        if asyncio.get_running_loop() is loop:
+            return await coro
+        # The websocket and the pending prompts live on the background loop.
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    async def _submit_and_wait(
+        self, prompt: dict, timeout: Optional[float]
+    ) -> Tuple[str, dict]:
+        # Connect before queueing so no message about the prompt can be missed.
+        await self._ensure_ws()
+        connections = self._ws_connections
+        loop = asyncio.get_running_loop()
+        resp = await loop.run_in_executor(
+            None, self.queue_prompt, prompt, self._client_id
+        )
         _log.debug(resp)
         prompt_id = resp["prompt_id"]
-        _log.info(f"Connecting to {self.ws_url.format(client_id).split('@')[-1]}")
-        
-        # Increase timeout to 5 minutes (300 seconds)
-        async with websockets.connect(
-            uri=self.ws_url.format(client_id),
-            ping_interval=None,
-            ping_timeout=300
-        ) as websocket:
+
+        if prompt_id in self._finished:
+            # Finished before queue_prompt returned.
+            outputs, error = self._finished.pop(prompt_id)
+            if error is not None:
+                raise error
+            return prompt_id, outputs
+
+        future = loop.create_future()
+        self._pending[prompt_id] = future
+        try:
+            # The connection may have dropped while the prompt was being posted.
+            await self._ensure_ws()
+            if self._ws_connections != connections:
+                # Messages about the prompt may have been lost with the old connection.
+                self._schedule_history_check([prompt_id])
+            # A single deadline for the whole wait, rather than a timer per received frame.
+            outputs = await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(prompt_id, None)
+        return prompt_id, outputs
+
+    async def _ensure_ws(self):
+        if self._ws_lock is None:
+            self._ws_lock = asyncio.Lock()
+        async with self._ws_lock:
+            if self._ws_task is None or self._ws_task.done():
+                self._ws = await self._ws_connect()
+                self._ws_task = asyncio.ensure_future(self._read_ws())
+
+    async def _ws_connect(self):
+        _log.info("Connecting to %s%s", self._ws_base_safe, self._client_id)
+        websocket = await ws_connect(
+            uri=self._ws_base + self._client_id,
+            ping_interval=20,
+            ping_timeout=20,
+            max_size=8 * 1024 * 1024,
+            max_queue=64,
+            compression=None,
+        )
+        _set_nodelay(websocket)
+        self._ws_connections += 1
+        return websocket
+
+    async def _read_ws(self):
+        """
+        Reads the shared websocket and resolves the pending prompts. A lost connection
+        is re-established with exponential backoff while prompts are still waiting;
+        once nobody waits the reader stops and _ensure_ws reconnects on the next prompt.
+        """
+        failures = 0
+        while True:
+            try:
+                while True:
+                    out = await self._ws.recv()
+                    failures = 0
+                    try:
+                        self._handle_ws_message(out)
+                    except Exception:
+                        _log.warning("Failed to handle websocket message", exc_info=True)
+            except ConnectionClosed as e:
+                error = e
+                _log.warning("Connection lost.")
+
             while True:
+                if not self._pending:
+                    self._ws = None
+                    return
+                failures += 1
+                if failures > _WS_RECONNECT_ATTEMPTS:
+                    self._ws = None
+                    self._fail_pending(error)
+                    return
+                delay = min(
+                    _WS_RECONNECT_BASE_DELAY * 2 ** (failures - 1),
+                    _WS_RECONNECT_MAX_DELAY,
+                )
+                _log.warning("Reconnecting in %.1f s...", delay)
+                await asyncio.sleep(delay)
+                if not self._pending:
+                    self._ws = None
+                    return
                 try:
-                    out = await asyncio.wait_for(websocket.recv(), timeout=300)
-                    if isinstance(out, str):
-                        message = json.loads(out)
-                        if message["type"] == "crystools.monitor":
-                            continue
-                        _log.debug(message)
-                        if message["type"] == "execution_error":
-                            data = message["data"]
-                            if data["prompt_id"] == prompt_id:
-                                raise Exception("Execution error occurred.")
-                        if message["type"] == "status":
-                            data = message["data"]
-                            if data["status"]["exec_info"]["queue_remaining"] == 0:
-                                return prompt_id
-                        if message["type"] == "executing":
-                            data = message["data"]
-                            if data["node"] is None and data["prompt_id"] == prompt_id:
-                                return prompt_id
-                except asyncio.TimeoutError:
-                    print("Connection timed out. Retrying...")
+                    self._ws = await self._ws_connect()
+                except Exception as e:
+                    error = e
                     continue
+                break
+            # Completion messages sent while we were disconnected are lost; ask the
+            # history about every prompt that is still waiting.
+            self._schedule_history_check(list(self._pending))
+
+    def _fail_pending(self, error: BaseException):
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+
+    def _handle_ws_message(self, out):
+        """
+        Processes a single websocket frame.
+
+        Args:
+            out (str | bytes): The raw websocket frame.
+
+        Raises:
+            KeyError: If a known message type is missing expected fields.
+        """
+        if not isinstance(out, str):
+            return
+        # Monitor telemetry arrives on every tick and is never used,
+        # so drop it before paying for a full JSON decode.
+        if '"crystools.monitor"' in out[:64]:
+            return
+        message = _json_loads(out)
+        handler = self._ws_handlers.get(message.get("type"))
+        if handler is None:
+            return
+        _log.debug(message)
+        handler(message["data"])
+
+    def _on_execution_error(self, data: dict):
+        self._finish_prompt(data["prompt_id"], Exception("Execution error occurred."))
+
+    def _on_status(self, data: dict):
+        if data["status"]["exec_info"]["queue_remaining"] == 0 and self._pending:
+            # Covers prompts whose completion message was missed, e.g. during a
+            # reconnect; the history tells which of them have really finished.
+            self._schedule_history_check(list(self._pending))
+
+    def _on_executing(self, data: dict):
+        if data["node"] is None:
+            self._finish_prompt(data["prompt_id"])
+
+    def _on_executed(self, data: dict):
+        if data.get("output") is not None:
+            self._outputs.setdefault(data["prompt_id"], {})[data["node"]] = data["output"]
+
+    def _schedule_history_check(self, prompt_ids: List[str]):
+        task = asyncio.ensure_future(self._check_history(prompt_ids))
+        self._history_checks.add(task)
+        task.add_done_callback(self._history_checks.discard)
+
+    async def _check_history(self, prompt_ids: List[str]):
+        for prompt_id in prompt_ids:
+            if prompt_id not in self._pending:
+                continue
+            try:
+                history = await self._aget_history(prompt_id)
+            except Exception:
+                _log.debug("Could not get history for %s", prompt_id, exc_info=True)
+                continue
+            if prompt_id not in history or prompt_id not in self._pending:
+                continue
+            entry = history[prompt_id]
+            outputs = self._outputs.setdefault(prompt_id, {})
+            for node_id, output in entry.get("outputs", {}).items():
+                outputs.setdefault(node_id, output)
+            if (entry.get("status") or {}).get("status_str") == "error":
+                self._finish_prompt(prompt_id, Exception("Execution error occurred."))
+            else:
+                self._finish_prompt(prompt_id)
+
+    def _finish_prompt(self, prompt_id: str, error: Optional[Exception] = None):
+        outputs = self._outputs.pop(prompt_id, {})
+        future = self._pending.pop(prompt_id, None)
+        if future is None:
+            # Nobody waits for it yet: either queue_prompt has not returned, or the
+            # prompt was queued by someone else. Keep a bounded number of these.
+            # A failed prompt is followed by its final 'executing' message, which
+            # must not replace the recorded error.
+            previous = self._finished.get(prompt_id)
+            if previous is None or previous[1] is None:
+                self._finished[prompt_id] = (outputs, error)
+            if len(self._finished) > 64:
+                del self._finished[next(iter(self._finished))]
+        elif not future.done():
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(outputs)
 
     def queue_and_wait_images(
         self, prompt: ComfyWorkflowWrapper, output_node_title: str
@@ -133,50 +459,140 @@ class ComfyApiWrapper:
         Raises:
             Exception: If the request fails with a non-200 status code.
         """
-        loop = asyncio.get_event_loop()
-        prompt_id = loop.run_until_complete(self.queue_prompt_and_wait(prompt.get_prompt()))
-        history = self.get_history(prompt_id)
+        return self._run_sync(self.aqueue_and_wait_images(prompt, output_node_title))
+
+    async def aqueue_and_wait_images(
+        self, prompt: ComfyWorkflowWrapper, output_node_title: str
+    ) -> dict:
+        """
+        Async version of queue_and_wait_images, to be awaited from a running event loop.
+
+        Args:
+            prompt (ComfyWorkflowWrapper): The ComfyWorkflowWrapper object representing the prompt.
+            output_node_title (str): The title of the output node.
+
+        Returns:
+            dict: A dictionary mapping image filenames to their content.
+
+        Raises:
+            Exception: If the request fails with a non-200 status code.
+        """
+        prompt_id, outputs = await self._queue_prompt_and_collect(prompt.get_prompt())
         output_node_id = prompt.get_node_id(output_node_title)
-        
-        print(f"Prompt ID: {prompt_id}")
-        print(f"Output Node ID: {output_node_id}")
-        print(f"All node IDs: {prompt.get_node_ids()}")
-        
-        if prompt_id not in history:
-            raise KeyError(f"Prompt ID {prompt_id} not found in history")
-        
-        if "outputs" not in history[prompt_id]:
-            raise KeyError(f"No outputs found for prompt ID {prompt_id}")
-        
-        if output_node_id not in history[prompt_id]["outputs"]:
-            raise KeyError(f"Output node {output_node_id} not found in history")
-        
-        output_data = history[prompt_id]["outputs"][output_node_id]
-        
+
+        _log.debug("Prompt ID: %s", prompt_id)
+        _log.debug("Output Node ID: %s", output_node_id)
+        if _log.isEnabledFor(logging.DEBUG):
+            _log.debug("All node IDs: %s", prompt.get_node_ids())
+
+        if output_node_id in outputs:
+            output_data = outputs[output_node_id]
+        else:
+            # Not reported over the websocket (e.g. the node was cached), ask the history.
+            history = await self._aget_history(prompt_id)
+
+            if prompt_id not in history:
+                raise KeyError(f"Prompt ID {prompt_id} not found in history")
+
+            if "outputs" not in history[prompt_id]:
+                raise KeyError(f"No outputs found for prompt ID {prompt_id}")
+
+            if output_node_id not in history[prompt_id]["outputs"]:
+                raise KeyError(f"Output node {output_node_id} not found in history")
+
+            output_data = history[prompt_id]["outputs"][output_node_id]
+
         if "images" in output_data:
-            return {
-                image["filename"]: self.get_image(
-                    image["filename"], image["subfolder"], image["type"]
-                )
-                for image in output_data["images"]
-            }
+            items = output_data["images"]
         elif "gifs" in output_data:
-            return {
-                gif["filename"]: self.get_image(
-                    gif["filename"], gif["subfolder"], gif["type"]
-                )
-                for gif in output_data["gifs"]
-            }
+            items = output_data["gifs"]
         elif "videos" in output_data:
-            return {
-                video["filename"]: self.get_image(
-                    video["filename"], video["subfolder"], video["type"]
-                )
-                for video in output_data["videos"]
-            }
+            items = output_data["videos"]
         else:
             raise KeyError(f"No images, gifs, or videos found in output node {output_node_id}")
 
+        filenames = [item["filename"] for item in items]
+        images = await asyncio.gather(
+            *(
+                self._aget_image(filename, item["subfolder"], item["type"])
+                for filename, item in zip(filenames, items)
+            )
+        )
+        return dict(zip(filenames, images))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Closes the websocket, stops the background event loop and closes the HTTP session.
+        """
+        with self._bg_lock:
+            loop, thread = self._bg_loop, self._bg_thread
+            self._bg_loop = self._bg_thread = None
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(self._close_ws(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+        self.session.close()
+
+    async def _close_ws(self):
+        # Wake up everyone still waiting, so no caller blocks on a stopped loop.
+        self._fail_pending(RuntimeError("ComfyApiWrapper closed"))
+        if self._ws_task is not None:
+            self._ws_task.cancel()
+            self._ws_task = None
+        # Every other coroutine on this loop was submitted by a caller that blocks on it
+        # (e.g. image downloads in queue_and_wait_images): let the failed waiters finish,
+        # then cancel whatever is still running.
+        tasks = asyncio.all_tasks() - {asyncio.current_task()}
+        if tasks:
+            await asyncio.wait(tasks, timeout=0.1)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._ws is not None:
+            await self._ws.close()
+            self._ws = None
+        self._ws_lock = None
+        self._outputs.clear()
+        self._finished.clear()
+
+    def _get_bg_loop(self) -> asyncio.AbstractEventLoop:
+        with self._bg_lock:
+            if self._bg_loop is None:
+                if uvloop is not None:
+                    loop = uvloop.new_event_loop()
+                else:
+                    loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name="comfy-api-loop", daemon=True
+                )
+                thread.start()
+                self._bg_loop, self._bg_thread = loop, thread
+            return self._bg_loop
+
+    def _run_sync(self, coro):
+        """
+        Runs a coroutine on the background event loop and blocks until it completes.
+        Works from plain code as well as from inside another running loop (e.g. Jupyter).
+        """
+        loop = self._get_bg_loop()
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            coro.close()
+            raise RuntimeError(
+                "Cannot block on the background event loop from within itself"
+            )
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
     def get_queue(self) -> dict:
         """
         Retrieves the entire prompt queue.
@@ -187,9 +603,9 @@ class ComfyApiWrapper:
         Raises:
             Exception: If the request fails with a non-200 status code.
         """
-        url = urljoin(self.url, f"/queue")
-        _log.info(f"Getting queue from {url}")
-        resp = requests.get(url, auth=self.auth)
+        url = self._url_queue
+        _log.info("Getting queue from %s", url)
+        resp = self.session.get(url)
         if resp.status_code == 200:
             return resp.json()
         else:
@@ -211,17 +627,41 @@ class ComfyApiWrapper:
             Exception: If the request fails with a non-200 status code.
             ValueError: If prompt_id is not in the queue.
         """
-        resp = self.get_queue()
-        for elem in resp["queue_running"]:
-            if elem[1] == prompt_id:
-                return 0
+        positions = self._queue_positions(self.get_queue())
+        if prompt_id not in positions:
+            raise ValueError("prompt_id is not in the queue")
+        return positions[prompt_id]
+
+    def get_queue_positions(self, prompt_ids: List[str]) -> Dict[str, int]:
+        """
+        Retrieves the number of prompts in the queue before each of several prompts,
+        using a single request.
 
-        result = 1
-        for elem in resp["queue_pending"]:
-            if elem[1] == prompt_id:
-                return result
-            result = result + 1
-        raise ValueError("prompt_id is not in the queue")
+        Args:
+            prompt_ids (List[str]): The IDs of the prompts.
+
+        Returns:
+            Dict[str, int]: A mapping of prompt ID to the number of prompts before it,
+                0 means the prompt is running. Prompts that are not in the queue are omitted.
+
+        Raises:
+            Exception: If the request fails with a non-200 status code.
+        """
+        positions = self._queue_positions(self.get_queue())
+        return {
+            prompt_id: positions[prompt_id]
+            for prompt_id in prompt_ids
+            if prompt_id in positions
+        }
+
+    @staticmethod
+    def _queue_positions(queue: dict) -> Dict[str, int]:
+        positions = {
+            elem[1]: i for i, elem in enumerate(queue["queue_pending"], start=1)
+        }
+        for elem in queue["queue_running"]:
+            positions[elem[1]] = 0
+        return positions
 
     def get_history(self, prompt_id: str) -> dict:
         """
@@ -236,9 +676,9 @@ class ComfyApiWrapper:
         Raises:
             Exception: If the request fails with a non-200 status code.
         """
-        url = urljoin(self.url, f"/history/{prompt_id}")
-        _log.info(f"Getting history from {url}")
-        resp = requests.get(url, auth=self.auth)
+        url = f"{self._url_history_prefix}{prompt_id}"
+        _log.info("Getting history from %s", url)
+        resp = self.session.get(url)
         if resp.status_code == 200:
             return resp.json()
         else:
@@ -246,6 +686,10 @@ class ComfyApiWrapper:
                 f"Request failed with status code {resp.status_code}: {resp.reason}"
             )
 
+    async def _aget_history(self, prompt_id: str) -> dict:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.get_history, prompt_id)
+
     def get_image(self, filename: str, subfolder: str, folder_type: str) -> bytes:
         """
         Retrieves an image from the Comfy API server.
@@ -262,16 +706,61 @@ class ComfyApiWrapper:
             Exception: If the request fails with a non-200 status code.
         """
         params = {"filename": filename, "subfolder": subfolder, "type": folder_type}
-        url = urljoin(self.url, f"/view?{urlencode(params)}")
-        _log.info(f"Getting image from {url}")
-        resp = requests.get(url, auth=self.auth)
-        _log.debug(f"{resp.status_code}: {resp.reason}")
-        if resp.status_code == 200:
-            return resp.content
-        else:
-            raise Exception(
-                f"Request failed with status code {resp.status_code}: {resp.reason}"
-            )
+        url = f"{self._url_view}?{urlencode(params)}"
+        _log.info("Getting image from %s", url)
+        with self.session.get(url, headers=_VIEW_HEADERS, stream=True) as resp:
+            _log.debug("%s: %s", resp.status_code, resp.reason)
+            if resp.status_code == 200:
+                buf = bytearray()
+                for chunk in resp.raw.stream(65536, decode_content=True):
+                    buf += chunk
+                return bytes(buf)
+            else:
+                raise Exception(
+                    f"Request failed with status code {resp.status_code}: {resp.reason}"
+                )
+
+    async def _aget_image(
+        self, filename: str, subfolder: str, folder_type: str
+    ) -> bytes:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, self.get_image, filename, subfolder, folder_type
+        )
+
+    def get_image_to_file(
+        self, filename: str, subfolder: str, folder_type: str, path: str
+    ) -> str:
+        """
+        Retrieves an image from the Comfy API server and writes it straight to a file,
+        without holding the whole content in memory.
+
+        Args:
+            filename (str): The filename of the image.
+            subfolder (str): The subfolder of the image.
+            folder_type (str): The type of the folder.
+            path (str): The path to save the image to.
+
+        Returns:
+            str: The path the image was saved to.
+
+        Raises:
+            Exception: If the request fails with a non-200 status code.
+        """
+        params = {"filename": filename, "subfolder": subfolder, "type": folder_type}
+        url = f"{self._url_view}?{urlencode(params)}"
+        _log.info("Getting image from %s to %s", url, path)
+        with self.session.get(url, headers=_VIEW_HEADERS, stream=True) as resp:
+            _log.debug("%s: %s", resp.status_code, resp.reason)
+            if resp.status_code == 200:
+                resp.raw.decode_content = True
+                with open(path, "wb") as f:
+                    shutil.copyfileobj(resp.raw, f, 1 << 20)
+                return path
+            else:
+                raise Exception(
+                    f"Request failed with status code {resp.status_code}: {resp.reason}"
+                )
 
     def upload_image(
         self, filename: str, subfolder: str = "default_upload_folder"
@@ -289,13 +778,23 @@ class ComfyApiWrapper:
         Raises:
             Exception: If the request fails with a non-200 status code.
         """
-        url = urljoin(self.url, "/upload/image")
+        url = self._url_upload
         serv_file = os.path.basename(filename)
         data = {"subfolder": subfolder}
-        files = {"image": (serv_file, open(filename, "rb"))}
-        _log.info(f"Posting {filename} to {url} with data {data}")
-        resp = requests.post(url, files=files, data=data, auth=self.auth)
-        _log.debug(f"{resp.status_code}: {resp.reason}, {resp.text}")
+        _log.info("Posting %s to %s with data %s", filename, url, data)
+        with open(filename, "rb") as f:
+            if MultipartEncoder is not None:
+                # Stream the file from disk instead of building the whole body in memory.
+                encoder = MultipartEncoder(
+                    fields={**data, "image": (serv_file, f, "application/octet-stream")}
+                )
+                resp = self.session.post(
+                    url, data=encoder, headers={"Content-Type": encoder.content_type}
+                )
+            else:
+                resp = self.session.post(url, files={"image": (serv_file, f)}, data=data)
+        if _log.isEnabledFor(logging.DEBUG):
+            _log.debug("%s: %s, %s", resp.status_code, resp.reason, resp.text)
         if resp.status_code == 200:
             return resp.json()
         else:
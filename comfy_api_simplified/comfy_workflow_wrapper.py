@@ -41,7 +41,7 @@ class ComfyWorkflowWrapper(dict):
         smth_changed = False
         for node in super().values():
             if node["_meta"]["title"] == title:
-                _log.info(f"Setting parameter '{param}' of node '{title}' to '{value}'")
+                _log.info("Setting parameter '%s' of node '%s' to '%s'", param, title, value)
                 node["inputs"][param] = value
                 smth_changed = True
         if not smth_changed:
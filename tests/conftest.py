@@ -8,7 +8,9 @@ test_data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "test_d
 
 @pytest.fixture
 def api_wrapper():
-    return ComfyApiWrapper("http://127.0.0.1:8188")
+    wrapper = ComfyApiWrapper("http://127.0.0.1:8188")
+    yield wrapper
+    wrapper.close()
 
 
 @pytest.fixture
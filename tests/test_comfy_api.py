@@ -120,3 +120,114 @@ async def test_get_image(
     assert compare_images(
         returned_image, expected_image
     ), "The returned image does not match the expected image"
+
+
+@pytest.mark.asyncio
+async def test_get_image_to_file(
+    api_wrapper: ComfyApiWrapper, workflow_wrapper: ComfyWorkflowWrapper, tmp_path
+):
+    expected_image = load_image_from_test_data("output.png")
+
+    image_metadata = api_wrapper.upload_image(os.path.join(test_data_dir, "input.png"))
+
+    workflow_wrapper.set_node_param(
+        "Load Image",
+        "image",
+        f"{image_metadata['subfolder']}/{image_metadata['name']}",
+    )
+
+    prompt_id = await api_wrapper.queue_prompt_and_wait(workflow_wrapper)
+    response = api_wrapper.get_history(prompt_id)
+
+    output = response[prompt_id]["outputs"]["9"]["images"][0]
+    path = str(tmp_path / output["filename"])
+    returned_path = api_wrapper.get_image_to_file(
+        output["filename"], output["subfolder"], output["type"], path
+    )
+
+    assert returned_path == path
+    with open(path, "rb") as f:
+        assert f.read() == api_wrapper.get_image(
+            output["filename"], output["subfolder"], output["type"]
+        )
+    assert compare_images(
+        Image.open(path), expected_image
+    ), "The saved image does not match the expected image"
+
+
+def test_get_queue_positions(
+    api_wrapper: ComfyApiWrapper, workflow_wrapper: ComfyWorkflowWrapper
+):
+    image_metadata = api_wrapper.upload_image(os.path.join(test_data_dir, "input.png"))
+
+    workflow_wrapper.set_node_param(
+        "Load Image",
+        "image",
+        f"{image_metadata['subfolder']}/{image_metadata['name']}",
+    )
+
+    prompt_id = api_wrapper.queue_prompt(workflow_wrapper)["prompt_id"]
+    positions = api_wrapper.get_queue_positions([prompt_id, "not-a-prompt-id"])
+
+    assert positions == {prompt_id: 0}
+
+
+@pytest.mark.asyncio
+async def test_aqueue_and_wait_images(
+    api_wrapper: ComfyApiWrapper, workflow_wrapper: ComfyWorkflowWrapper
+):
+    expected_image = load_image_from_test_data("output.png")
+
+    image_metadata = api_wrapper.upload_image(os.path.join(test_data_dir, "input.png"))
+
+    workflow_wrapper.set_node_param(
+        "Load Image",
+        "image",
+        f"{image_metadata['subfolder']}/{image_metadata['name']}",
+    )
+
+    results = await api_wrapper.aqueue_and_wait_images(workflow_wrapper, "Save Image")
+
+    assert results
+    for image in results.values():
+        assert compare_images(
+            Image.open(io.BytesIO(image)), expected_image
+        ), "The returned image does not match the expected image"
+
+
+@pytest.mark.asyncio
+async def test_queue_prompts_and_wait(
+    api_wrapper: ComfyApiWrapper, workflow_wrapper: ComfyWorkflowWrapper
+):
+    image_metadata = api_wrapper.upload_image(os.path.join(test_data_dir, "input.png"))
+
+    workflow_wrapper.set_node_param(
+        "Load Image",
+        "image",
+        f"{image_metadata['subfolder']}/{image_metadata['name']}",
+    )
+
+    prompt_ids = await api_wrapper.queue_prompts_and_wait(
+        [workflow_wrapper, workflow_wrapper]
+    )
+
+    assert len(prompt_ids) == 2
+    for prompt_id in prompt_ids:
+        assert prompt_id in api_wrapper.get_history(prompt_id)
+
+
+def test_close(api_wrapper: ComfyApiWrapper, workflow_wrapper: ComfyWorkflowWrapper):
+    image_metadata = api_wrapper.upload_image(os.path.join(test_data_dir, "input.png"))
+
+    workflow_wrapper.set_node_param(
+        "Load Image",
+        "image",
+        f"{image_metadata['subfolder']}/{image_metadata['name']}",
+    )
+
+    assert api_wrapper.queue_and_wait_images(workflow_wrapper, "Save Image")
+    api_wrapper.close()
+
+    # The wrapper starts a new loop and connection when used again.
+    assert api_wrapper.queue_and_wait_images(workflow_wrapper, "Save Image")
+    api_wrapper.close()
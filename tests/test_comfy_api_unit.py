@@ -0,0 +1,158 @@
+import asyncio
+import concurrent.futures
+import json
+import time
+import pytest
+from comfy_api_simplified.comfy_api_wrapper import ComfyApiWrapper
+
+
+def test_queue_positions():
+    queue = {
+        "queue_running": [[0, "running"]],
+        "queue_pending": [[1, "first"], [2, "second"]],
+    }
+
+    positions = ComfyApiWrapper._queue_positions(queue)
+
+    assert positions == {"running": 0, "first": 1, "second": 2}
+
+
+def test_queue_positions_empty_queue():
+    assert ComfyApiWrapper._queue_positions(
+        {"queue_running": [], "queue_pending": []}
+    ) == {}
+
+
+def ws_message(type: str, data: dict) -> str:
+    return json.dumps({"type": type, "data": data})
+
+
+@pytest.mark.asyncio
+async def test_handle_ws_message_finishes_prompt(api_wrapper: ComfyApiWrapper):
+    future = asyncio.get_running_loop().create_future()
+    api_wrapper._pending["p1"] = future
+    output = {"images": [{"filename": "a.png", "subfolder": "", "type": "output"}]}
+
+    api_wrapper._handle_ws_message(
+        ws_message("executed", {"prompt_id": "p1", "node": "9", "output": output})
+    )
+    assert not future.done()
+    api_wrapper._handle_ws_message(
+        ws_message("executing", {"prompt_id": "p1", "node": None})
+    )
+
+    assert future.result() == {"9": output}
+    assert "p1" not in api_wrapper._pending
+
+
+@pytest.mark.asyncio
+async def test_handle_ws_message_execution_error(api_wrapper: ComfyApiWrapper):
+    future = asyncio.get_running_loop().create_future()
+    api_wrapper._pending["p1"] = future
+
+    api_wrapper._handle_ws_message(ws_message("execution_error", {"prompt_id": "p1"}))
+
+    with pytest.raises(Exception, match="Execution error occurred."):
+        future.result()
+
+
+@pytest.mark.asyncio
+async def test_handle_ws_message_ignores_other_frames(api_wrapper: ComfyApiWrapper):
+    future = asyncio.get_running_loop().create_future()
+    api_wrapper._pending["p1"] = future
+
+    api_wrapper._handle_ws_message(b"\x00\x00\x00\x01binary preview")
+    api_wrapper._handle_ws_message(ws_message("crystools.monitor", {"cpu_utilization": 1}))
+    api_wrapper._handle_ws_message(ws_message("progress", {"prompt_id": "p1", "value": 1}))
+    api_wrapper._handle_ws_message(
+        ws_message("executing", {"prompt_id": "p1", "node": "3"})
+    )
+    api_wrapper._handle_ws_message(
+        ws_message("status", {"status": {"exec_info": {"queue_remaining": 1}}})
+    )
+
+    assert not future.done()
+    assert not api_wrapper._history_checks
+
+
+@pytest.mark.asyncio
+async def test_finish_prompt_after_registration(api_wrapper: ComfyApiWrapper):
+    future = asyncio.get_running_loop().create_future()
+    api_wrapper._pending["p1"] = future
+    api_wrapper._outputs["p1"] = {"9": {"images": []}}
+
+    api_wrapper._finish_prompt("p1")
+
+    assert future.result() == {"9": {"images": []}}
+    assert "p1" not in api_wrapper._pending
+    assert "p1" not in api_wrapper._outputs
+    assert "p1" not in api_wrapper._finished
+
+
+def test_finish_prompt_before_registration(api_wrapper: ComfyApiWrapper):
+    error = Exception("Execution error occurred.")
+    api_wrapper._outputs["p1"] = {"9": {"images": []}}
+
+    api_wrapper._finish_prompt("p1")
+    api_wrapper._finish_prompt("p2", error)
+
+    assert api_wrapper._finished == {
+        "p1": ({"9": {"images": []}}, None),
+        "p2": ({}, error),
+    }
+
+
+def test_finish_prompt_before_registration_keeps_error(api_wrapper: ComfyApiWrapper):
+    api_wrapper._handle_ws_message(ws_message("execution_error", {"prompt_id": "p1"}))
+    api_wrapper._handle_ws_message(
+        ws_message("executing", {"prompt_id": "p1", "node": None})
+    )
+
+    outputs, error = api_wrapper._finished["p1"]
+    assert str(error) == "Execution error occurred."
+
+
+def test_finish_prompt_before_registration_is_bounded(api_wrapper: ComfyApiWrapper):
+    for i in range(100):
+        api_wrapper._finish_prompt(f"p{i}")
+
+    assert len(api_wrapper._finished) == 64
+    assert "p0" not in api_wrapper._finished
+    assert "p99" in api_wrapper._finished
+
+
+def test_close_fails_pending_prompts(api_wrapper: ComfyApiWrapper):
+    async def wait_for_prompt():
+        future = asyncio.get_running_loop().create_future()
+        api_wrapper._pending["p1"] = future
+        return await future
+
+    loop = api_wrapper._get_bg_loop()
+    waiter = asyncio.run_coroutine_threadsafe(wait_for_prompt(), loop)
+    while "p1" not in api_wrapper._pending:
+        time.sleep(0.01)
+
+    api_wrapper.close()
+
+    with pytest.raises(RuntimeError, match="ComfyApiWrapper closed"):
+        waiter.result(timeout=5)
+    assert not api_wrapper._pending
+
+
+def test_close_cancels_running_calls(api_wrapper: ComfyApiWrapper):
+    loop = api_wrapper._get_bg_loop()
+    call = asyncio.run_coroutine_threadsafe(asyncio.sleep(60), loop)
+
+    api_wrapper.close()
+
+    with pytest.raises(concurrent.futures.CancelledError):
+        call.result(timeout=5)
+
+
+def test_context_manager_closes(api_wrapper: ComfyApiWrapper):
+    with api_wrapper as wrapper:
+        loop = wrapper._get_bg_loop()
+
+    assert wrapper is api_wrapper
+    assert api_wrapper._bg_loop is None
+    assert loop.is_closed()